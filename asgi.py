@@ -0,0 +1,118 @@
+"""ASGI entry point: the async generation API in front of the Flask app.
+
+    uvicorn asgi:application --workers 2
+
+``POST /api/generate`` runs on the asyncio engine, so a single process can keep
+many generations in flight without a thread each. Every other path is handed
+to the existing Flask routes through asgiref's WSGI adapter. Batches queued via
+``/api/batch`` run on this server's loop and engine, so they share the same
+per-provider limits.
+"""
+import asyncio
+import json
+import time
+from asgiref.wsgi import WsgiToAsgi
+from app import batch_runner, create_app, drafts
+from async_pipeline import AsyncGenerationEngine
+from generators import audio_generator, image_generator, story_generator
+from telemetry import (
+    HTTP_LATENCY, HTTP_REQUESTS, get_logger, new_trace_id, reset_trace_id, set_trace_id,
+)
+
+log = get_logger('asgi')
+
+MAX_BODY_BYTES = 64 * 1024
+
+flask_app = create_app()
+wsgi = WsgiToAsgi(flask_app)
+engine = AsyncGenerationEngine()
+
+
+async def _read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if len(body) > MAX_BODY_BYTES:
+            raise ValueError('Request body too large')
+        if not message.get('more_body'):
+            return body
+
+
+async def _send_json(send, status, payload, trace_id):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            (b'x-trace-id', trace_id.encode()),
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def generate_api(scope, receive, send):
+    """JSON twin of /generate: returns the draft instead of rendering a page"""
+    headers = dict(scope.get('headers') or [])
+    trace_id = headers.get(b'x-request-id', b'').decode() or new_trace_id()
+    token = set_trace_id(trace_id)
+    started = time.perf_counter()
+    status = 500
+    try:
+        try:
+            spec = json.loads(await _read_body(receive) or b'{}')
+        except ValueError as e:
+            status = 400
+            return await _send_json(send, status, {'errors': [str(e)]}, trace_id)
+
+        missing = [name for name in ('theme', 'language', 'age_group')
+                   if not isinstance(spec, dict) or not str(spec.get(name) or '').strip()]
+        if missing:
+            status = 400
+            return await _send_json(send, status, {'errors': [f"{name} missing" for name in missing]}, trace_id)
+
+        draft = await engine.generate(str(spec['theme']).strip(), str(spec['language']).strip(),
+                                      str(spec['age_group']).strip(),
+                                      str(spec.get('image_style') or 'cartoon').strip())
+        draft_id = await asyncio.to_thread(drafts.put, draft)
+        status = 200
+        await _send_json(send, status, dict(draft, draft_id=draft_id), trace_id)
+    except Exception as e:
+        log.exception("Async generation error", error=str(e))
+        await _send_json(send, status, {'errors': ['Error generating story']}, trace_id)
+    finally:
+        HTTP_LATENCY.observe(time.perf_counter() - started, method='POST', endpoint='api_generate')
+        HTTP_REQUESTS.inc(method='POST', endpoint='api_generate', status=status)
+        reset_trace_id(token)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                # Build provider clients before the first request instead of on the event loop
+                for provider in (story_generator, image_generator, audio_generator):
+                    await asyncio.to_thread(provider.get)
+                batch_runner.attach(engine, asyncio.get_running_loop())
+            except Exception as e:
+                # Reported to the server, which then refuses to start instead of running without lifespan
+                log.exception("ASGI startup failed", error=str(e))
+                await engine.aclose()
+                await send({'type': 'lifespan.startup.failed', 'message': f"{type(e).__name__}: {e}"})
+                return
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await engine.aclose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] == 'http' and scope['path'] == '/api/generate' and scope['method'] == 'POST':
+        return await generate_api(scope, receive, send)
+    return await wsgi(scope, receive, send)
@@ -0,0 +1,158 @@
+"""Asyncio generation engine: story -> image prompts -> images, plus audio.
+
+Provider calls are awaited instead of blocking a thread: Gemini through the
+SDK's ``generate_content_async`` and Clipdrop/ElevenLabs through a shared
+``httpx.AsyncClient``. The six image chains and the narration run concurrently
+inside a TaskGroup once the story exists, and per-provider semaphores keep any
+one API from being flooded when many generations are in flight.
+"""
+import asyncio
+import os
+from contextvars import ContextVar
+import httpx
+from generators import audio_generator, image_generator, story_generator
+from telemetry import FALLBACKS, get_logger, stage
+
+log = get_logger('async_pipeline')
+
+# Fallback kinds hit by the generation running in the current context
+_fallbacks = ContextVar('fallbacks', default=None)
+
+
+def _note_fallback(kind):
+    fallbacks = _fallbacks.get()
+    if fallbacks is not None:
+        fallbacks.append(kind)
+
+
+class AsyncGenerationEngine:
+    def __init__(self, gemini_concurrency=None, clipdrop_concurrency=None, elevenlabs_concurrency=None,
+                 timeout=60.0):
+        self.limits = {
+            'gemini': gemini_concurrency or int(os.getenv('GEMINI_CONCURRENCY', '16')),
+            'clipdrop': clipdrop_concurrency or int(os.getenv('CLIPDROP_CONCURRENCY', '8')),
+            'elevenlabs': elevenlabs_concurrency or int(os.getenv('ELEVENLABS_CONCURRENCY', '4')),
+        }
+        self._semaphores = {name: asyncio.Semaphore(limit) for name, limit in self.limits.items()}
+        self.timeout = timeout
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            connections = self.limits['clipdrop'] + self.limits['elevenlabs']
+            self._client = httpx.AsyncClient(timeout=self.timeout,
+                                             limits=httpx.Limits(max_connections=connections))
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def generate_story(self, theme, language, age_group):
+        generator = story_generator.get()
+        try:
+            async with self._semaphores['gemini']:
+                with stage('gemini_story', language=language):
+                    response = await generator.model.generate_content_async(
+                        generator.build_prompt(theme, language, age_group))
+            return generator.parse_story(response.text.strip(), theme, language)
+        except Exception as e:
+            log.warning("Gemini story generation failed", language=language, error=str(e))
+            _note_fallback('story')
+            return generator.get_fallback_story(theme, language)
+
+    async def visual_prompt(self, chunk_text, image_style):
+        generator = image_generator.get()
+        if generator.prompt_model:
+            try:
+                async with self._semaphores['gemini']:
+                    with stage('gemini_image_prompt'):
+                        response = await generator.prompt_model.generate_content_async(
+                            generator.rewrite_request(chunk_text))
+                return generator.finish_visual_prompt(response.text, image_style)
+            except Exception as e:
+                log.warning("Error generating English prompt", error=str(e))
+        return generator.fallback_visual_prompt(image_style)
+
+    async def generate_image(self, chunk_text, image_style, index):
+        generator = image_generator.get()
+        if not generator.api_key:
+            FALLBACKS.inc(kind='image')
+            _note_fallback('image')
+            return await asyncio.to_thread(generator.create_placeholder, index, "Clipdrop API key missing")
+
+        prompt = await self.visual_prompt(chunk_text, image_style)
+        try:
+            async with self._semaphores['clipdrop']:
+                with stage('clipdrop_image', index=index) as span:
+                    response = await self.client.post(
+                        generator.api_url, headers={'x-api-key': generator.api_key},
+                        files={'prompt': (None, prompt, 'text/plain')})
+                    if response.status_code != 200:
+                        span['outcome'] = 'fallback'
+            if response.status_code == 200:
+                return await asyncio.to_thread(generator.save_image, response.content, index)
+            log.warning("Clipdrop error", index=index, status=response.status_code, body=response.text[:500])
+        except Exception as e:
+            log.warning("Clipdrop image generation failed", index=index, error=str(e))
+
+        FALLBACKS.inc(kind='image')
+        _note_fallback('image')
+        return await asyncio.to_thread(generator.create_placeholder, index, "Image generation failed")
+
+    async def generate_audio(self, text, language):
+        generator = audio_generator.get()
+        if generator.elevenlabs_api_key:
+            url, data, headers = generator.build_request(text, language)
+            try:
+                async with self._semaphores['elevenlabs']:
+                    with stage('elevenlabs_audio', language=language) as span:
+                        response = await self.client.post(url, json=data, headers=headers)
+                        if response.status_code != 200:
+                            span['outcome'] = 'fallback'
+                if response.status_code == 200:
+                    return await asyncio.to_thread(generator.save_audio, response.content, language)
+                log.warning("ElevenLabs API error", status=response.status_code, body=response.text[:500])
+            except Exception as e:
+                log.warning("Professional audio generation failed", language=language, error=str(e))
+
+        FALLBACKS.inc(kind='audio')
+        _note_fallback('audio')
+        return await asyncio.to_thread(generator.create_simple_audio_placeholder, text, language)
+
+    async def generate(self, theme, language, age_group, image_style='cartoon'):
+        """Run the full pipeline and return a dict shaped like a draft.
+
+        ``fallbacks`` lists which of story/image/audio used canned content or
+        placeholders instead of a provider response.
+        """
+        log.info("Starting async generation", theme=theme, language=language, age_group=age_group,
+                 image_style=image_style)
+        fallbacks = []
+        token = _fallbacks.set(fallbacks)
+        try:
+            story_title, chunks = await self.generate_story(theme, language, age_group)
+
+            # Tasks copy this context, so they append to the same list
+            async with asyncio.TaskGroup() as group:
+                image_tasks = [group.create_task(self.generate_image(chunk, image_style, index))
+                               for index, chunk in enumerate(chunks)]
+                audio_task = group.create_task(self.generate_audio(" ".join(chunks), language))
+        finally:
+            _fallbacks.reset(token)
+
+        image_paths = [task.result() for task in image_tasks]
+        log.info("Async generation completed", images=len(image_paths), audio=bool(audio_task.result()))
+        return {
+            'story_title': story_title,
+            'theme': theme,
+            'language': language,
+            'age_group': age_group,
+            'image_style': image_style,
+            'chunks': chunks,
+            'image_paths': [path for path in image_paths if path],
+            'audio_path': audio_task.result() or '',
+            'fallbacks': sorted(set(fallbacks)),
+        }
@@ -0,0 +1,291 @@
+"""Bulk story generation, e.g. one story per theme on a school syllabus.
+
+A batch is deduplicated up front, then every item runs through a shared
+AsyncGenerationEngine: at most ``max_parallel`` stories are in flight and the
+engine's per-provider semaphores keep Gemini, Clipdrop and ElevenLabs within
+their own limits. Finished stories are written with batched inserts. Items
+that used a canned story or placeholder media finish as ``fallback``, not
+``done``. Job and item status is kept in the ``batch_jobs`` table, so any
+worker process can report on a job.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from telemetry import REGISTRY, get_logger, reset_trace_id, set_trace_id
+
+log = get_logger('batch')
+
+MAX_BATCH_ITEMS = 200
+FINISHED = ('done', 'failed')
+SPEC_FIELDS = ('theme', 'language', 'age_group', 'image_style')
+REQUIRED_FIELDS = ('theme', 'language', 'age_group')
+
+BATCH_ITEMS = REGISTRY.counter('storyteller_batch_items_total', 'Batch items by final status', ('status',))
+
+
+def normalize_specs(raw_specs):
+    """Validate batch items and drop duplicates.
+
+    Two items are duplicates when all four fields match ignoring case and
+    whitespace. Returns (unique specs, errors).
+    """
+    if not isinstance(raw_specs, list) or not raw_specs:
+        return [], ['items must be a non-empty list']
+    if len(raw_specs) > MAX_BATCH_ITEMS:
+        return [], [f'At most {MAX_BATCH_ITEMS} items per batch']
+
+    unique = {}
+    errors = []
+    for index, spec in enumerate(raw_specs):
+        if not isinstance(spec, dict):
+            errors.append(f"item {index}: must be an object")
+            continue
+        values = {name: ' '.join(str(spec.get(name) or '').split()) for name in SPEC_FIELDS}
+        values['image_style'] = values['image_style'] or 'cartoon'
+        missing = [name for name in REQUIRED_FIELDS if not values[name]]
+        if missing:
+            errors.append(f"item {index}: {', '.join(missing)} missing")
+            continue
+        unique.setdefault(tuple(values[name].casefold() for name in SPEC_FIELDS), values)
+    return list(unique.values()), errors
+
+
+class BatchJob:
+    def __init__(self, specs, requested=None):
+        self.id = uuid.uuid4().hex
+        self.requested = requested or len(specs)
+        self.items = [dict(spec, status='pending', story_id=None, error=None, fallbacks=[], duration_s=None)
+                      for spec in specs]
+        self.status = 'pending'
+        self.started_at = None
+        self.finished_at = None
+
+    def state(self):
+        return {'id': self.id, 'requested': self.requested, 'items': self.items, 'status': self.status,
+                'started_at': self.started_at, 'finished_at': self.finished_at}
+
+    @classmethod
+    def from_state(cls, state):
+        job = cls([], state['requested'])
+        job.id = state['id']
+        job.items = state['items']
+        job.status = state['status']
+        job.started_at = state['started_at']
+        job.finished_at = state['finished_at']
+        return job
+
+    def summary(self):
+        counts = {}
+        for item in self.items:
+            counts[item['status']] = counts.get(item['status'], 0) + 1
+
+        elapsed = None
+        if self.started_at:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        saved = counts.get('done', 0) + counts.get('fallback', 0)
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'requested': self.requested,
+            'unique': len(self.items),
+            'counts': counts,
+            'elapsed_s': round(elapsed, 2) if elapsed is not None else None,
+            'stories_per_minute': round(saved / elapsed * 60, 2) if elapsed else None,
+            'items': self.items,
+        }
+
+
+class BatchRunner:
+    """Runs batches on one long-lived event loop.
+
+    All jobs share the same engine (so the per-provider limits apply across
+    jobs) and the same pool of ``max_parallel`` story slots. Under an asyncio
+    server, ``attach`` the server's loop and engine so batches and API
+    requests share one set of limits; otherwise a private loop thread and
+    engine are created on first use.
+
+    Job state is written to SQLite when a job is queued, as items finish and
+    when it ends, so ``get`` works from any process. Finished jobs are kept
+    for ``BATCH_JOB_RETENTION_DAYS`` (7).
+    """
+
+    def __init__(self, db, max_parallel=None, save_batch_size=10, keep_jobs=50, retention_days=None):
+        self.db = db
+        self.max_parallel = max_parallel or int(os.getenv('BATCH_MAX_PARALLEL', '8'))
+        self.save_batch_size = save_batch_size
+        self.keep_jobs = keep_jobs
+        self.retention = (retention_days or float(os.getenv('BATCH_JOB_RETENTION_DAYS', '7'))) * 86400
+        self._jobs = OrderedDict()  # jobs this process runs or recently ran
+        self._lock = threading.Lock()
+        self._loop = None
+        self._engine = None
+        self._slots = None
+        self._table_ready = False
+
+    def init_db(self):
+        conn = sqlite3.connect(self.db.db_path)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS batch_jobs (
+                id TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                finished_at REAL
+            )
+        ''')
+        conn.commit()
+        conn.close()
+        self._table_ready = True
+
+    def _connect(self):
+        # Created on first use, like the drafts table
+        if not self._table_ready:
+            self.init_db()
+        return sqlite3.connect(self.db.db_path)
+
+    def _write_state(self, job_id, state, finished_at):
+        conn = self._connect()
+        try:
+            conn.execute('INSERT OR REPLACE INTO batch_jobs (id, state, finished_at) VALUES (?, ?, ?)',
+                         (job_id, state, finished_at))
+            conn.execute('DELETE FROM batch_jobs WHERE finished_at < ?', (time.time() - self.retention,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _store(self, job):
+        self._write_state(job.id, json.dumps(job.state(), ensure_ascii=False), job.finished_at)
+
+    async def _store_async(self, job):
+        # Serialised on the loop so the snapshot is consistent; only the write leaves it
+        state = json.dumps(job.state(), ensure_ascii=False)
+        try:
+            await asyncio.to_thread(self._write_state, job.id, state, job.finished_at)
+        except Exception as e:
+            log.warning("Cannot store batch state", job_id=job.id, error=str(e))
+
+    def attach(self, engine, loop):
+        """Run batches on ``loop`` with ``engine`` instead of a private loop thread"""
+        with self._lock:
+            if self._loop is not None and self._loop is not loop:
+                raise RuntimeError('BatchRunner is already running on another event loop')
+            self._engine = engine
+            self._loop = loop
+
+    def _event_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name='batch-loop', daemon=True).start()
+            return self._loop
+
+    def submit(self, specs, requested=None):
+        """Queue a batch and return its job immediately"""
+        job = BatchJob(specs, requested)
+        self._store(job)
+        self._remember(job)
+        asyncio.run_coroutine_threadsafe(self._execute(job), self._event_loop())
+        return job
+
+    def _remember(self, job):
+        with self._lock:
+            self._jobs[job.id] = job
+            # Unfinished jobs stay in memory; finished ones can be read back from SQLite
+            finished = [job_id for job_id, kept in self._jobs.items() if kept.status in FINISHED]
+            for job_id in finished[:max(0, len(self._jobs) - self.keep_jobs)]:
+                del self._jobs[job_id]
+
+    def get(self, job_id):
+        """Return the job, whichever process runs it, or None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT state FROM batch_jobs WHERE id = ?', (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return BatchJob.from_state(json.loads(row[0])) if row else None
+
+    def run(self, job):
+        """Run a batch and block until it finishes"""
+        self._store(job)
+        self._remember(job)
+        return asyncio.run_coroutine_threadsafe(self._execute(job), self._event_loop()).result()
+
+    async def _execute(self, job):
+        token = set_trace_id(job.id[:16])
+        try:
+            await self._run(job)
+        except Exception as e:
+            log.exception("Batch failed", job_id=job.id, error=str(e))
+            job.status = 'failed'
+        finally:
+            job.finished_at = time.time()
+            await self._store_async(job)
+            reset_trace_id(token)
+        summary = job.summary()
+        log.info("Batch finished", job_id=job.id, status=job.status, counts=summary['counts'],
+                 elapsed_s=summary['elapsed_s'], stories_per_minute=summary['stories_per_minute'])
+        return job
+
+    async def _run(self, job):
+        if self._engine is None:
+            # Imported here so the web app doesn't load httpx until a batch runs
+            from async_pipeline import AsyncGenerationEngine
+            self._engine = AsyncGenerationEngine()
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_parallel)
+
+        job.status = 'running'
+        job.started_at = time.time()
+        await self._store_async(job)
+        unsaved = []
+
+        async def flush():
+            batch = unsaved[:]
+            unsaved.clear()
+            try:
+                story_ids = await asyncio.to_thread(self.db.save_stories, [story for _, story in batch])
+            except Exception as e:
+                log.exception("Batch save failed", count=len(batch), error=str(e))
+                for item, _ in batch:
+                    item.update(status='failed', error='Error saving story')
+                    BATCH_ITEMS.inc(status='failed')
+            else:
+                for (item, _), story_id in zip(batch, story_ids):
+                    status = 'fallback' if item['fallbacks'] else 'done'
+                    item.update(status=status, story_id=story_id)
+                    BATCH_ITEMS.inc(status=status)
+            await self._store_async(job)
+
+        async def work(item):
+            async with self._slots:
+                item['status'] = 'running'
+                started = time.perf_counter()
+                try:
+                    story = await self._engine.generate(item['theme'], item['language'], item['age_group'],
+                                                        item['image_style'])
+                except Exception as e:
+                    log.warning("Batch item failed", theme=item['theme'], error=str(e))
+                    item.update(status='failed', error=str(e))
+                    BATCH_ITEMS.inc(status='failed')
+                    return
+                finally:
+                    item['duration_s'] = round(time.perf_counter() - started, 2)
+            item.update(status='saving', fallbacks=story.get('fallbacks') or [])
+            unsaved.append((item, story))
+            if len(unsaved) >= self.save_batch_size:
+                await flush()
+
+        async with asyncio.TaskGroup() as group:
+            for item in job.items:
+                group.create_task(work(item))
+        if unsaved:
+            await flush()
+
+        job.status = 'done'
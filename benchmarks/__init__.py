@@ -0,0 +1 @@
+"""Load and startup benchmarks run against local provider fakes."""
@@ -0,0 +1,131 @@
+"""Local stand-ins for Gemini, Clipdrop and ElevenLabs.
+
+Each fake has configurable latency, error rate and payload size so the
+benchmarks exercise the real request path without spending API quota.
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeBehaviour:
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, payload_bytes=1024):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.payload_bytes = payload_bytes
+
+    def wait(self):
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def should_fail(self):
+        return random.random() < self.error_rate
+
+
+class _ProviderHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+
+        if self.path.startswith('/clipdrop'):
+            behaviour, content_type = self.server.clipdrop, 'image/png'
+        elif self.path.startswith('/elevenlabs'):
+            behaviour, content_type = self.server.elevenlabs, 'audio/mpeg'
+        else:
+            self.send_error(404)
+            return
+
+        behaviour.wait()
+        if behaviour.should_fail():
+            body, status, content_type = b'{"error": "injected failure"}', 500, 'application/json'
+        else:
+            body, status = b'\0' * behaviour.payload_bytes, 200
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeProviderServer:
+    """HTTP server answering Clipdrop (/clipdrop) and ElevenLabs (/elevenlabs/<voice>) calls"""
+
+    def __init__(self, clipdrop=None, elevenlabs=None, host='127.0.0.1', port=0):
+        self.httpd = ThreadingHTTPServer((host, port), _ProviderHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.clipdrop = clipdrop or FakeBehaviour(payload_bytes=200_000)
+        self.httpd.elevenlabs = elevenlabs or FakeBehaviour(payload_bytes=500_000)
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def clipdrop_url(self):
+        return f"{self.base_url}/clipdrop"
+
+    @property
+    def elevenlabs_url(self):
+        return f"{self.base_url}/elevenlabs"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='fake-providers', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class _FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+def fake_generative_model(behaviour):
+    """Return a drop-in replacement for ``genai.GenerativeModel``.
+
+    Story prompts (which ask for JSON) get a six-chunk story whose chunk
+    length follows ``behaviour.payload_bytes``; anything else gets a short
+    visual description, like the image prompt rewrite.
+    """
+    class FakeGenerativeModel:
+        def __init__(self, model_name=None, generation_config=None, safety_settings=None, **kwargs):
+            self.model_name = model_name
+
+        def _respond(self, prompt):
+            if behaviour.should_fail():
+                raise RuntimeError('injected Gemini failure')
+            if 'JSON' in prompt:
+                words = max(1, behaviour.payload_bytes // 6 // 6)
+                chunk = ' '.join(['word'] * words)
+                return _FakeResponse(json.dumps({
+                    'title': 'Benchmark Story',
+                    'chunks': [f"Part {i + 1}: {chunk}" for i in range(6)],
+                }))
+            return _FakeResponse('A child walking through a lantern-lit village at dusk')
+
+        def generate_content(self, prompt, **kwargs):
+            behaviour.wait()
+            return self._respond(prompt)
+
+    return FakeGenerativeModel
@@ -0,0 +1,217 @@
+"""Drive the Flask app against local provider fakes and report latency.
+
+    python -m benchmarks.load --requests 50 --concurrency 8 --output bench.json
+    python -m benchmarks.load --baseline bench.json
+
+Runs in a temporary working directory so the benchmark database and media
+files never touch the real ones.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from unittest import mock
+
+from benchmarks.fakes import FakeBehaviour, FakeProviderServer, fake_generative_model
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+THEMES = ['Diwali lights', 'The clever crow', 'Monsoon festival', 'Elephant and the mouse']
+
+
+def summarize(samples, wall_seconds=None):
+    ordered = sorted(samples)
+    if not ordered:
+        return {'count': 0}
+
+    def pct(q):
+        return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+    summary = {
+        'count': len(ordered),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 2),
+        'p50_ms': round(pct(50) * 1000, 2),
+        'p95_ms': round(pct(95) * 1000, 2),
+        'p99_ms': round(pct(99) * 1000, 2),
+        'max_ms': round(ordered[-1] * 1000, 2),
+    }
+    if wall_seconds:
+        summary['throughput_rps'] = round(len(ordered) / wall_seconds, 2)
+    return summary
+
+
+class StageRecorder:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.outcomes = defaultdict(lambda: defaultdict(int))
+        self._lock = threading.Lock()
+
+    def __call__(self, stage, outcome, seconds):
+        with self._lock:
+            self.samples[stage].append(seconds)
+            self.outcomes[stage][outcome] += 1
+
+    def report(self):
+        return {stage: dict(summarize(samples), outcomes=dict(self.outcomes[stage]))
+                for stage, samples in sorted(self.samples.items())}
+
+
+def run_phase(app, name, requests, concurrency):
+    """Issue ``requests`` (callables taking a test client) with ``concurrency`` workers"""
+    local = threading.local()
+    latencies = []
+    statuses = defaultdict(int)
+    lock = threading.Lock()
+
+    def worker(send):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.test_client()
+        started = time.perf_counter()
+        try:
+            response = send(client)
+            # Streamed pages render while the body is read; closing runs the request teardown
+            response.get_data()
+            response.close()
+            status = response.status_code
+        except Exception as e:
+            status = type(e).__name__
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            statuses[str(status)] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, requests))
+    wall = time.perf_counter() - started
+
+    result = dict(summarize(latencies, wall), statuses=dict(statuses))
+    print(f"{name:>12}: {result.get('p50_ms')} ms p50, {result.get('p95_ms')} ms p95, "
+          f"{result.get('throughput_rps')} req/s, statuses {dict(statuses)}")
+    return result
+
+
+def run(args):
+    gemini = FakeBehaviour(args.gemini_latency, args.jitter, args.error_rate, args.story_bytes)
+    clipdrop = FakeBehaviour(args.clipdrop_latency, args.jitter, args.error_rate, args.image_bytes)
+    elevenlabs = FakeBehaviour(args.elevenlabs_latency, args.jitter, args.error_rate, args.audio_bytes)
+    recorder = StageRecorder()
+    original_cwd = os.getcwd()
+
+    with FakeProviderServer(clipdrop, elevenlabs) as providers, tempfile.TemporaryDirectory() as workdir:
+        os.environ.update({
+            'CLIPDROP_API_URL': providers.clipdrop_url,
+            'ELEVENLABS_API_URL': providers.elevenlabs_url,
+            'CLIPDROP_API_KEY': 'benchmark',
+            'ELEVENLABS_API_KEY': 'benchmark',
+            'GEMINI_API_KEY': 'benchmark',
+            'LOG_LEVEL': args.log_level,
+        })
+        os.chdir(workdir)
+        sys.path.insert(0, REPO_ROOT)
+
+        import google.generativeai as genai
+        with mock.patch.object(genai, 'GenerativeModel', fake_generative_model(gemini)):
+            import app as app_module
+            from telemetry import add_stage_listener, remove_stage_listener
+
+            app_module.db.migrate()
+            app = app_module.create_app()
+            add_stage_listener(recorder)
+            try:
+                endpoints = {}
+                count, concurrency = args.requests, args.concurrency
+
+                endpoints['generate'] = run_phase(app, 'generate', [
+                    lambda c, i=i: c.post('/generate', data={
+                        'theme': THEMES[i % len(THEMES)], 'language': 'English',
+                        'age_group': '6-8', 'image_style': 'cartoon'})
+                    for i in range(count)
+                ], concurrency)
+
+                draft_ids = [app_module.drafts.put({
+                    'story_title': 'Benchmark Story', 'theme': THEMES[i % len(THEMES)],
+                    'language': 'English', 'age_group': '6-8', 'image_style': 'cartoon',
+                    'chunks': ['Once upon a time'] * 6, 'image_paths': [], 'audio_path': '',
+                }) for i in range(count)]
+                endpoints['save_story'] = run_phase(app, 'save_story', [
+                    lambda c, draft_id=draft_id: c.post('/save_story', json={'draft_id': draft_id})
+                    for draft_id in draft_ids
+                ], concurrency)
+
+                endpoints['stories'] = run_phase(app, 'stories', [
+                    lambda c: c.get('/stories') for _ in range(count)
+                ], concurrency)
+
+                story_ids = [story['id'] for story in app_module.db.get_all_stories()] or [1]
+                endpoints['story'] = run_phase(app, 'story', [
+                    lambda c, i=i: c.get(f"/story/{story_ids[i % len(story_ids)]}") for i in range(count)
+                ], concurrency)
+            finally:
+                remove_stage_listener(recorder)
+                os.chdir(original_cwd)
+
+    return {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'config': vars(args),
+        },
+        'endpoints': endpoints,
+        'stages': recorder.report(),
+    }
+
+
+def compare(results, baseline):
+    """Print p50/p95 change against a previous results file"""
+    print("\nChange vs baseline (positive = slower):")
+    for section in ('endpoints', 'stages'):
+        for name, current in results[section].items():
+            previous = baseline.get(section, {}).get(name)
+            if not previous or not previous.get('count') or not current.get('count'):
+                continue
+            deltas = []
+            for key in ('p50_ms', 'p95_ms'):
+                if previous[key]:
+                    deltas.append(f"{key} {(current[key] - previous[key]) / previous[key] * 100:+.1f}%")
+            print(f"  {section[:-1]} {name}: {', '.join(deltas)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=20, help='requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--gemini-latency', type=float, default=0.5, help='seconds per Gemini call')
+    parser.add_argument('--clipdrop-latency', type=float, default=1.0, help='seconds per Clipdrop call')
+    parser.add_argument('--elevenlabs-latency', type=float, default=1.5, help='seconds per ElevenLabs call')
+    parser.add_argument('--jitter', type=float, default=0.0, help='+/- seconds added to every fake call')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of fake calls that fail')
+    parser.add_argument('--story-bytes', type=int, default=2400, help='approximate size of a generated story')
+    parser.add_argument('--image-bytes', type=int, default=200_000)
+    parser.add_argument('--audio-bytes', type=int, default=500_000)
+    parser.add_argument('--log-level', default='WARNING')
+    parser.add_argument('--output', help='write results JSON here')
+    parser.add_argument('--baseline', help='results JSON to compare against')
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""Measure cold-start and per-worker startup cost.
+
+    python -m benchmarks.startup --runs 5 --workers 4 --output startup.json
+
+* cold start: a fresh interpreter importing ``app`` and calling ``create_app()``
+* heavy imports: what ``google.generativeai`` and Pillow would add if imported eagerly
+* per worker: after ``create_app()`` in a parent (like ``gunicorn --preload``),
+  forked children time their first request and first provider initialisation
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.load import REPO_ROOT, summarize
+
+COLD_START = """
+import sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+print(imported - started, time.perf_counter() - imported)
+"""
+
+MIGRATE = """
+import sys
+sys.path.insert(0, {root!r})
+import app
+app.db.migrate()
+"""
+
+IMPORT_ONLY = """
+import time
+started = time.perf_counter()
+import {module}
+print(time.perf_counter() - started)
+"""
+
+
+def _python(code, cwd):
+    env = dict(os.environ, LOG_LEVEL='WARNING')
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', code], cwd=cwd, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return time.perf_counter() - started, output.split()
+
+
+def cold_start(runs, workdir):
+    imports, factories, processes = [], [], []
+    for _ in range(runs):
+        wall, (imported, created) = _python(COLD_START.format(root=REPO_ROOT), workdir)
+        imports.append(float(imported))
+        factories.append(float(created))
+        processes.append(wall)
+    return {
+        'import_app': summarize(imports),
+        'create_app': summarize(factories),
+        'process_wall': summarize(processes),
+    }
+
+
+def heavy_imports(runs, workdir):
+    results = {}
+    for module in ('google.generativeai', 'PIL.Image'):
+        try:
+            samples = [float(_python(IMPORT_ONLY.format(module=module), workdir)[1][0]) for _ in range(runs)]
+        except subprocess.CalledProcessError:
+            results[module] = {'error': 'not installed'}
+            continue
+        results[module] = summarize(samples)
+    return results
+
+
+def per_worker(workers, workdir):
+    """Fork ``workers`` children from a parent that already ran create_app()"""
+    sys.path.insert(0, REPO_ROOT)
+    original_cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        return _fork_workers(workers)
+    finally:
+        os.chdir(original_cwd)
+
+
+def _fork_workers(workers):
+    import app as app_module
+    from generators import story_generator
+
+    flask_app = app_module.create_app()
+    first_request, provider_init = [], []
+    for _ in range(workers):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            started = time.perf_counter()
+            flask_app.test_client().get('/metrics')
+            requested = time.perf_counter()
+            try:
+                story_generator.get()
+                initialised = time.perf_counter() - requested
+            except Exception:
+                initialised = -1
+            os.write(write_fd, json.dumps([requested - started, initialised]).encode())
+            os._exit(0)
+
+        os.close(write_fd)
+        with os.fdopen(read_fd) as pipe:
+            request_time, init_time = json.loads(pipe.read())
+        os.waitpid(pid, 0)
+        first_request.append(request_time)
+        if init_time >= 0:
+            provider_init.append(init_time)
+
+    return {'first_request': summarize(first_request), 'story_provider_init': summarize(provider_init)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--output', help='write results JSON here')
+    args = parser.parse_args(argv)
+    output = os.path.abspath(args.output) if args.output else None
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # Like a deployment: migrate once, then time startups against a current schema
+        _python(MIGRATE.format(root=REPO_ROOT), workdir)
+        results = {
+            'cold_start': cold_start(args.runs, workdir),
+            'heavy_imports': heavy_imports(args.runs, workdir),
+        }
+        if hasattr(os, 'fork'):
+            results['per_worker'] = per_worker(args.workers, workdir)
+
+    print(json.dumps(results, indent=2))
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
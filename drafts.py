@@ -0,0 +1,116 @@
+"""Server-side store for generated-but-unsaved stories.
+
+Every draft is written through to a SQLite table, so any worker process can
+promote it and it survives restarts until it expires. A small in-memory LRU
+in front of the table saves re-reading payloads; ownership on ``pop`` is
+always decided by the table.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from telemetry import CACHE_REQUESTS, get_logger
+
+log = get_logger('drafts')
+
+DRAFT_FIELDS = ('story_title', 'theme', 'language', 'age_group', 'image_style',
+                'chunks', 'image_paths', 'audio_path')
+
+
+class DraftStore:
+    def __init__(self, db_path='stories.db', capacity=None, ttl=None):
+        self.db_path = db_path
+        self.capacity = capacity or int(os.getenv('DRAFT_CACHE_SIZE', '256'))
+        self.ttl = ttl or int(os.getenv('DRAFT_TTL_SECONDS', str(6 * 3600)))
+        self._drafts = OrderedDict()  # draft_id -> (expires_at, draft), read cache only
+        self._lock = threading.Lock()
+        self._table_ready = False
+
+    def init_db(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS drafts (
+                id TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+        conn.commit()
+        conn.close()
+        self._table_ready = True
+
+    def _connect(self):
+        # The table is created on first SQLite access rather than at startup
+        if not self._table_ready:
+            self.init_db()
+        return sqlite3.connect(self.db_path)
+
+    def _cache(self, draft_id, expires_at, draft):
+        with self._lock:
+            self._drafts[draft_id] = (expires_at, draft)
+            self._drafts.move_to_end(draft_id)
+            while len(self._drafts) > self.capacity:
+                self._drafts.popitem(last=False)
+
+    def _write(self, draft_id, draft):
+        now = time.time()
+        expires_at = now + self.ttl
+        conn = self._connect()
+        try:
+            conn.execute('INSERT OR REPLACE INTO drafts (id, payload, expires_at) VALUES (?, ?, ?)',
+                         (draft_id, json.dumps(draft, ensure_ascii=False), expires_at))
+            conn.execute('DELETE FROM drafts WHERE expires_at <= ?', (now,))
+            conn.commit()
+        finally:
+            conn.close()
+        self._cache(draft_id, expires_at, draft)
+
+    def put(self, draft):
+        """Store a draft and return its id"""
+        draft_id = uuid.uuid4().hex
+        self._write(draft_id, {name: draft.get(name) for name in DRAFT_FIELDS})
+        return draft_id
+
+    def restore(self, draft_id, draft):
+        """Put a popped draft back, e.g. when saving it failed"""
+        self._write(draft_id, draft)
+
+    def pop(self, draft_id):
+        """Remove and return a draft so it can only be promoted once, by any process"""
+        now = time.time()
+        with self._lock:
+            entry = self._drafts.pop(draft_id, None)
+
+        conn = self._connect()
+        try:
+            row = None
+            if entry is None:
+                row = conn.execute('SELECT payload FROM drafts WHERE id = ? AND expires_at > ?',
+                                   (draft_id, now)).fetchone()
+            # Only the caller whose DELETE hits an unexpired row owns the draft
+            deleted = conn.execute('DELETE FROM drafts WHERE id = ? AND expires_at > ?',
+                                   (draft_id, now)).rowcount
+            conn.commit()
+        finally:
+            conn.close()
+
+        if not deleted or (entry is None and row is None):
+            CACHE_REQUESTS.inc(cache='drafts', result='miss')
+            return None
+        if entry is not None:
+            CACHE_REQUESTS.inc(cache='drafts', result='hit')
+            return entry[1]
+        CACHE_REQUESTS.inc(cache='drafts', result='db_hit')
+        return json.loads(row[0])
+
+    def live_drafts(self):
+        """Yield every unexpired draft, including those created by other processes"""
+        conn = self._connect()
+        try:
+            for (payload,) in conn.execute('SELECT payload FROM drafts WHERE expires_at > ?', (time.time(),)):
+                yield json.loads(payload)
+        finally:
+            conn.close()
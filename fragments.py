@@ -0,0 +1,75 @@
+"""Per-chapter HTML fragments with a byte-bounded LRU cache.
+
+Story pages iterate ``chapters`` lazily, so with ``stream_template`` the first
+chapter reaches the client before later ones are rendered. Saved stories
+never change, so their fragments are cached by (story id, chapter, language).
+"""
+import itertools
+import os
+import threading
+from collections import OrderedDict
+from flask import render_template
+from markupsafe import Markup
+from telemetry import CACHE_REQUESTS, stage
+
+CHAPTER_TEMPLATE = '_chapter.html'
+
+
+class FragmentCache:
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes or int(os.getenv('FRAGMENT_CACHE_BYTES', str(8 * 1024 * 1024)))
+        self._fragments = OrderedDict()  # key -> (html, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._fragments.get(key)
+            if entry is not None:
+                self._fragments.move_to_end(key)
+        CACHE_REQUESTS.inc(cache='fragments', result='hit' if entry else 'miss')
+        return entry[0] if entry else None
+
+    def put(self, key, html):
+        size = len(html.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._fragments.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._fragments[key] = (html, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._fragments.popitem(last=False)
+                self._bytes -= evicted_size
+
+    @property
+    def size_bytes(self):
+        return self._bytes
+
+
+def render_chapter(index, language, text, image_path, chapter_title):
+    with stage('render_chapter'):
+        return render_template(CHAPTER_TEMPLATE, index=index, language=language, text=text,
+                               image_path=image_path, chapter_title=chapter_title)
+
+
+def iter_chapters(chunks, image_paths, language, chapter_title, cache=None, story_id=None):
+    """Yield rendered chapters one at a time, reusing cached fragments for saved stories"""
+    for index, text in enumerate(chunks):
+        key = (story_id, index, language)
+        html = cache.get(key) if cache is not None and story_id is not None else None
+        if html is None:
+            image_path = image_paths[index] if index < len(image_paths) else None
+            html = render_chapter(index, language, text, image_path, chapter_title(language, index + 1))
+            if cache is not None and story_id is not None:
+                cache.put(key, html)
+        yield Markup(html)
+
+
+def start_chapters(chapters):
+    """Render the first chapter now, so a broken fragment template raises in the
+    view instead of truncating an already-started 200 response"""
+    first = next(chapters, None)
+    return chapters if first is None else itertools.chain([first], chapters)
@@ -0,0 +1,549 @@
+"""Story, image and audio generators backed by Gemini, Clipdrop and ElevenLabs.
+
+google.generativeai and Pillow are imported on first use, and each generator
+is built once per process through a LazyProvider, so importing this module is
+cheap and forked workers never inherit provider clients from their parent.
+"""
+import json
+import os
+import threading
+import uuid
+import requests
+from media import AUDIO_DIR, IMAGE_DIR, shard_path
+from telemetry import FALLBACKS, PLACEHOLDERS, get_logger, stage
+
+log = get_logger('generators')
+
+# Configure Gemini safety settings
+safety_settings = [
+    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"}
+]
+
+_genai = None
+_genai_lock = threading.Lock()
+
+def get_genai():
+    """Import and configure google.generativeai on first use"""
+    global _genai
+    if _genai is None:
+        with _genai_lock:
+            if _genai is None:
+                import google.generativeai as genai
+                genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
+                _genai = genai
+    return _genai
+
+class GeminiStoryGenerator:
+    def __init__(self):
+        try:
+            genai = get_genai()
+            self.model = genai.GenerativeModel(
+                model_name='gemini-2.0-flash',
+                generation_config=genai.types.GenerationConfig(
+                    temperature=0.7,
+                    top_k=32,
+                    top_p=0.8,
+                    max_output_tokens=1000,
+                ),
+                safety_settings=safety_settings
+            )
+            log.info("Initialized Gemini story model", model='gemini-2.0-flash')
+        except Exception as e:
+            log.error("Error initializing Gemini model", error=str(e))
+            raise
+
+    def build_prompt(self, theme, language, age_group):
+        """Build the story prompt for the selected language"""
+        language_prompts = {
+            "Hindi": f"""
+            "{theme}" के बारे में हिंदी भाषा में एक बेहतरीन कहानी लिखें।
+            निर्देश:
+            - केवल हिंदी भाषा का उपयोग करें (अंग्रेजी शब्द बिल्कुल नहीं)
+            - {age_group} आयु समूह के लिए उपयुक्त
+            - 6 भागों में कहानी बनाएं
+            - हर भाग में 60-70 शब्द
+            
+            JSON format में answer दें:
+            {{
+              "title": "हिंदी में कहानी का शीर्षक",
+              "chunks": [
+                "पहला भाग...",
+                "दूसरा भाग...",
+                "तीसरा भाग...",
+                "चौथा भाग...",
+                "पांचवा भाग...",
+                "छठा भाग..."
+              ]
+            }}
+            महत्वपूर्ण: केवल JSON return करें, कोई extra text नहीं।
+            """,
+            
+            "English": f"""
+            Write an excellent story about "{theme}" in English language only.
+            Instructions:
+            - Use English language ONLY
+            - Suitable for {age_group} age group
+            - Create story in 6 parts
+            - Each part should be 60-70 words
+            
+            Return in JSON format:
+            {{
+              "title": "Story title in English",
+              "chunks": [
+                "First part...",
+                "Second part...",
+                "Third part...",
+                "Fourth part...",
+                "Fifth part...",
+                "Sixth part..."
+              ]
+            }}
+            IMPORTANT: Return only JSON, no extra text.
+            """,
+            
+            "Marathi": f"""
+            "{theme}" बद्दल मराठी भाषेत उत्कृष्ट कथा लिहा।
+            सूचना:
+            - फक्त मराठी भाषा वापरा (इंग्रजी शब्द बिल्कुल नको)
+            - {age_group} वयोगटासाठी योग्य
+            - 6 भागांत कथा तयार करा
+            - प्रत्येक भागात 60-70 शब्द
+            
+            JSON format मध्ये उत्तर द्या:
+            {{
+              "title": "मराठीत कथेचे शीर्षक",
+              "chunks": [
+                "पहिला भाग...",
+                "दुसरा भाग...",
+                "तिसरा भाग...",
+                "चौठा भाग...",
+                "पाचवा भाग...",
+                "सहावा भाग..."
+              ]
+            }}
+            महत्वाचे: फक्त JSON return करा, extra text नको.
+            """,
+            
+            "Bengali": f"""
+            "{theme}" সম্পর্কে বাংলা ভাষায় একটি চমৎকার গল্প লিখুন।
+            নির্দেশনা:
+            - শুধুমাত্র বাংলা ভাষা ব্যবহার করুন (কোন ইংরেজি শব্দ নয়)
+            - {age_group} বয়সের গ্রুপের জন্য উপযুক্ত
+            - ৬টি অংশে গল্প তৈরি করুন
+            - প্রতিটি অংশে ৬০-৭০ শব্দ
+            
+            JSON ফরম্যাটে উত্তর দিন:
+            {{
+              "title": "বাংলায় গল্পের শিরোনাম",
+              "chunks": [
+                "প্রথম অংশ...",
+                "দ্বিতীয় অংশ...",
+                "তৃতীয় অংশ...",
+                "চতুর্থ অংশ...",
+                "পঞ্চম অংশ...",
+                "ষষ্ঠ অংশ..."
+              ]
+            }}
+            """,
+            
+            "Tamil": f"""
+            "{theme}" பற்றி தமிழ் மொழியில் ஒரு சிறந்த கதை எழுதுங்கள்।
+            வழிமுறைகள்:
+            - தமிழ் மொழியை மட்டுமே பயன்படுத்துங்கள் (ஆங்கில வார்த்தைகள் வேண்டாம்)
+            - {age_group} வயதுக்குரிய குழுவிற்கு ஏற்றது
+            - 6 பகுதிகளில் கதையை உருவாக்குங்கள்
+            - ஒவ்வொரு பகுதியும் 60-70 வார்த்தைகள்
+            
+            JSON வடிவத்தில் பதில் கொடுங்கள்:
+            {{
+              "title": "தமிழில் கதையின் தலைப்பு",
+              "chunks": [
+                "முதல் பகுতி...",
+                "இரண்டாவது பகுति...",
+                "மூன்றாவது பகுति...",
+                "நான்காவது பகுति...",
+                "ஐந்தாவது பகுति...",
+                "ஆறாவது பகுति..."
+              ]
+            }}
+            """,
+            
+            "Telugu": f"""
+            "{theme}" గురించి తెలుగు భాషలో ఒక అద్భుతమైన కథ రాయండి।
+            సూచనలు:
+            - తెలుగు భాషను మాత్రమే ఉపయోగించండి (ఆంగ్ల పదాలు వద్దు)
+            - {age_group} వయస్సు గ్రూపుకు తగినది
+            - 6 భాగాల్లో కథను సృష్టించండి
+            - ప్రతి భాగంలో 60-70 పదాలు
+            
+            JSON ఫార్మాట్‌లో సమాధానం ఇవ్వండి:
+            {{
+              "title": "తెలుగులో కథ యొక్క శీర్షిక",
+              "chunks": [
+                "మొదటి భాగం...",
+                "రెండవ భాగం...",
+                "మూడవ భాగం...",
+                "నాలుగవ భాగం...",
+                "ఐదవ భాగం...",
+                "ఆరవ భాగం..."
+              ]
+            }}
+            """
+        }
+        
+        return language_prompts.get(language, language_prompts["English"])
+
+    def parse_story(self, response_text, theme, language):
+        """Extract (title, six chunks) from a Gemini reply; raises on invalid JSON"""
+        # Extract JSON from response
+        json_start = response_text.find('{')
+        json_end = response_text.rfind('}') + 1
+        
+        if json_start == -1 or json_end <= json_start:
+            raise ValueError("Invalid JSON response from Gemini")
+        
+        json_text = response_text[json_start:json_end]
+        story_data = json.loads(json_text)
+        title = story_data.get('title', f'{theme} Story')
+        chunks = story_data.get('chunks', [])
+
+        # Ensure we have 6 chunks
+        while len(chunks) < 6:
+            chunks.append(self.create_additional_chunk(theme, language, len(chunks) + 1))
+
+        return title, chunks[:6]
+
+    def generate_pure_language_story(self, theme, language, age_group):
+        """Generate story with title using Gemini API in selected language"""
+        try:
+            prompt = self.build_prompt(theme, language, age_group)
+            log.info("Generating story", language=language)
+            
+            with stage('gemini_story', language=language):
+                response = self.model.generate_content(prompt)
+                response_text = response.text.strip()
+            
+            return self.parse_story(response_text, theme, language)
+                
+        except Exception as e:
+            log.warning("Gemini story generation failed", language=language, error=str(e))
+            return self.get_fallback_story(theme, language)
+
+    def create_additional_chunk(self, theme, language, chapter_num):
+        additional_chunks = {
+            "Hindi": f"अध्याय {chapter_num} में {theme} की कहानी और भी रोचक हो जाती है।",
+            "English": f"Chapter {chapter_num} makes the story of {theme} even more fascinating.",
+            "Marathi": f"अध्याय {chapter_num} मध्ये {theme} ची कथा अधिकच मनोरंजक होते।",
+            "Bengali": f"অধ্যায় {chapter_num}-এ {theme}-এর গল্প আরও আকর্ষণীয় হয়ে ওঠে।",
+            "Tamil": f"அத্தியாயம் {chapter_num}-ல் {theme} கதை இன்னும் சुवारসியमানतাக মাড়ুকিறিতু।",
+            "Telugu": f"అధ్యాయం {chapter_num}లో {theme} కథ మరింత ఆసక్తికరంగా మారుతుంది।"
+        }
+        return additional_chunks.get(language, additional_chunks["English"])
+
+    def get_fallback_story(self, theme, language):
+        fallback_stories = {
+            "Hindi": {
+                "title": f"{theme} की अद्भुत यात्रा",
+                "chunks": [
+                    f"{theme} की यह जादुई कहानी एक अनोखी दुनिया से शुरू होती है।",
+                    "यात्रा के दौरान मुख्य पात्र कई अनूठे लोगों से मिलता है।",
+                    "कहानी में कई रहस्यमय तत्व धीरे-धीरे सामने आते हैं।",
+                    "चुनौतियां कठिन होती जाती हैं लेकिन साहस बढ़ता जाता है।",
+                    "अंतिम चुनौती सबसे कठिन साबित होती है।",
+                    "कहानी खुशी के साथ समाप्त होती है और सभी सीख प्राप्त करते हैं।"
+                ]
+            },
+            "English": {
+                "title": f"The Amazing Adventure of {theme}",
+                "chunks": [
+                    f"The magical story of {theme} begins in an extraordinary world.",
+                    "During this journey, the main character meets unique companions.",
+                    "The story contains mysterious elements that gradually unfold.",
+                    "Challenges become difficult but courage continues growing.",
+                    "The final challenge proves most difficult to overcome.",
+                    "The story concludes with joy as characters learn valuable lessons."
+                ]
+            }
+        }
+        
+        FALLBACKS.inc(kind='story')
+        story = fallback_stories.get(language, fallback_stories["English"])
+        return story["title"], story["chunks"]
+
+class ClipdropImageGenerator:
+    def __init__(self):
+        self.api_key = os.getenv('CLIPDROP_API_KEY')
+        if not self.api_key:
+            log.warning("CLIPDROP_API_KEY not set - using placeholder images")
+        self.api_url = os.getenv('CLIPDROP_API_URL', 'https://clipdrop-api.co/text-to-image/v1')
+        
+        try:
+            genai = get_genai()
+            self.prompt_model = genai.GenerativeModel(
+                model_name='gemini-2.0-flash',
+                generation_config=genai.types.GenerationConfig(temperature=0.7, max_output_tokens=1000)
+            )
+            log.info("Initialized Gemini prompt model", model='gemini-2.0-flash')
+        except Exception as e:
+            log.warning("Could not initialize Gemini prompt model", error=str(e))
+            self.prompt_model = None
+
+    def generate_image(self, chunk_text, image_style, index, story_theme=None):
+        if not self.api_key:
+            FALLBACKS.inc(kind='image')
+            return self.create_placeholder(index, "Clipdrop API key missing")
+        
+        try:
+            log.info("Generating Clipdrop image", index=index)
+            
+            headers = {'x-api-key': self.api_key}
+            prompt = self.create_english_visual_prompt(chunk_text, image_style, story_theme)
+            files = {'prompt': (None, prompt, 'text/plain')}
+            
+            with stage('clipdrop_image', index=index) as span:
+                response = requests.post(self.api_url, headers=headers, files=files)
+                if response.status_code != 200:
+                    span['outcome'] = 'fallback'
+            
+            if response.status_code == 200:
+                return self.save_image(response.content, index)
+            else:
+                log.warning("Clipdrop error", index=index, status=response.status_code, body=response.text[:500])
+                FALLBACKS.inc(kind='image')
+                return self.create_placeholder(index, f"Image generation failed")
+                
+        except Exception as e:
+            log.warning("Clipdrop image generation failed", index=index, error=str(e))
+            FALLBACKS.inc(kind='image')
+            return self.create_placeholder(index, str(e))
+
+    def save_image(self, content, index):
+        filename = f"clipdrop_{uuid.uuid4().hex}_{index}.png"
+        filepath = shard_path(IMAGE_DIR, filename)
+        
+        with open(filepath, 'wb') as f:
+            f.write(content)
+        
+        log.info("Clipdrop image generated", index=index, bytes=len(content))
+        return filepath
+
+    def style_prompt(self, image_style):
+        style_base = {
+            "cartoon": "Disney Pixar style, vibrant colors, cute and expressive characters",
+            "comic": "comic book style, dynamic action, bold colors, strong outlines", 
+            "anime": "anime style, expressive faces, beautiful backgrounds",
+            "realistic": "photorealistic, detailed textures, natural lighting",
+            "watercolor": "soft watercolor style, gentle colors, artistic feel",
+            "oil_painting": "oil painting style, rich colors, classical look"
+        }
+        
+        return style_base.get(image_style, style_base["cartoon"])
+
+    def rewrite_request(self, chunk_text):
+        """Gemini prompt that turns a (possibly non-English) chunk into an English scene"""
+        return f"""Convert this story text to an English visual description: "{chunk_text}"
+                Create a detailed English image prompt that captures the main scene and characters.
+                Reply only in English. Keep under 150 characters."""
+
+    def finish_visual_prompt(self, visual_prompt, image_style):
+        visual_prompt = visual_prompt.strip().replace('\n', ' ')
+        final_prompt = f"{visual_prompt}. {self.style_prompt(image_style)}. High quality illustration."
+        return final_prompt[:300]
+
+    def fallback_visual_prompt(self, image_style):
+        FALLBACKS.inc(kind='image_prompt')
+        scene_description = f"A {image_style} style scene showing beautiful cultural story elements"
+        return f"{scene_description}. {self.style_prompt(image_style)}. High quality illustration."
+
+    def create_english_visual_prompt(self, chunk_text, image_style, story_theme=None):
+        """Create English prompt for image generation"""
+        if self.prompt_model:
+            try:
+                with stage('gemini_image_prompt'):
+                    response = self.prompt_model.generate_content(self.rewrite_request(chunk_text))
+                if hasattr(response, 'text'):
+                    return self.finish_visual_prompt(response.text, image_style)
+                    
+            except Exception as e:
+                log.warning("Error generating English prompt", error=str(e))
+        
+        return self.fallback_visual_prompt(image_style)
+
+    def create_placeholder(self, index, description):
+        try:
+            from PIL import Image, ImageDraw, ImageFont
+            
+            filename = f"placeholder_{index}_{uuid.uuid4().hex}.jpg"
+            filepath = shard_path(IMAGE_DIR, filename)
+            
+            img = Image.new('RGB', (1024, 1024), color='#f0f0f0')
+            draw = ImageDraw.Draw(img)
+            
+            try:
+                font = ImageFont.truetype("arial.ttf", 60)
+            except:
+                font = ImageFont.load_default()
+            
+            title = f"Chapter {index+1}"
+            bbox = draw.textbbox((0, 0), title, font=font)
+            width = bbox[2] - bbox[0]
+            x = (1024 - width) // 2
+            draw.text((x, 400), title, fill='#000000', font=font)
+            
+            img.save(filepath, quality=95, optimize=True)
+            PLACEHOLDERS.inc(kind='image')
+            return filepath
+            
+        except Exception as e:
+            log.error("Error creating placeholder", index=index, error=str(e))
+            return None
+
+# Professional Audio Generator using ElevenLabs API
+class ProfessionalAudioGenerator:
+    def __init__(self):
+        self.elevenlabs_api_key = os.getenv('ELEVENLABS_API_KEY')
+        self.api_url = os.getenv('ELEVENLABS_API_URL', 'https://api.elevenlabs.io/v1/text-to-speech')
+        
+        # Voice IDs for different languages (you'll need to get these from ElevenLabs)
+        self.voice_mapping = {
+            'Hindi': 'pNInz6obpgDQGcFmaJgB',  # Sample voice ID
+            'English': '21m00Tcm4TlvDq8ikWAM', # Sample voice ID  
+            'Marathi': 'pNInz6obpgDQGcFmaJgB',
+            'Bengali': 'pNInz6obpgDQGcFmaJgB',
+            'Tamil': 'pNInz6obpgDQGcFmaJgB',
+            'Telugu': 'pNInz6obpgDQGcFmaJgB'
+        }
+        
+        if self.elevenlabs_api_key:
+            log.info("Professional Audio Generator (ElevenLabs) initialized")
+        else:
+            log.warning("ElevenLabs API key not found - using fallback")
+
+    def generate_audio(self, text, language):
+        """Generate high-quality audio using ElevenLabs API"""
+        
+        if not self.elevenlabs_api_key:
+            FALLBACKS.inc(kind='audio')
+            return self.create_simple_audio_placeholder(text, language)
+        
+        try:
+            url, data, headers = self.build_request(text, language)
+            
+            log.info("Generating professional audio", language=language)
+            with stage('elevenlabs_audio', language=language) as span:
+                response = requests.post(url, json=data, headers=headers)
+                if response.status_code != 200:
+                    span['outcome'] = 'fallback'
+            
+            if response.status_code == 200:
+                return self.save_audio(response.content, language)
+            else:
+                log.warning("ElevenLabs API error", status=response.status_code, body=response.text[:500])
+                FALLBACKS.inc(kind='audio')
+                return self.create_simple_audio_placeholder(text, language)
+                
+        except Exception as e:
+            log.warning("Professional audio generation failed", language=language, error=str(e))
+            FALLBACKS.inc(kind='audio')
+            return self.create_simple_audio_placeholder(text, language)
+
+    def build_request(self, text, language):
+        """Return (url, json body, headers) for an ElevenLabs text-to-speech call"""
+        voice_id = self.voice_mapping.get(language, self.voice_mapping['English'])
+        
+        url = f"{self.api_url}/{voice_id}"
+        
+        headers = {
+            "Accept": "audio/mpeg",
+            "Content-Type": "application/json",
+            "xi-api-key": self.elevenlabs_api_key
+        }
+        
+        data = {
+            "text": text,
+            "model_id": "eleven_multilingual_v2",
+            "voice_settings": {
+                "stability": 0.5,
+                "similarity_boost": 0.75,
+                "style": 0.5,
+                "use_speaker_boost": True
+            }
+        }
+        return url, data, headers
+
+    def save_audio(self, content, language):
+        filename = f"professional_audio_{uuid.uuid4().hex}.mp3"
+        filepath = shard_path(AUDIO_DIR, filename)
+        
+        with open(filepath, 'wb') as f:
+            f.write(content)
+        
+        log.info("Professional audio generated", language=language, bytes=len(content))
+        return filepath
+
+    def create_simple_audio_placeholder(self, text, language):
+        """Create a simple audio data file as placeholder"""
+        try:
+            audio_data = {
+                "type": "tts_placeholder",
+                "text": text,
+                "language": language,
+                "voice_settings": {
+                    "rate": 0.8,
+                    "pitch": 1.0,
+                    "volume": 1.0
+                },
+                "duration_estimate": len(text.split()) * 0.5  # Rough estimate
+            }
+            
+            filename = f"audio_placeholder_{uuid.uuid4().hex}.json"
+            filepath = shard_path(AUDIO_DIR, filename)
+            
+            with open(filepath, 'w', encoding='utf-8') as f:
+                json.dump(audio_data, f, ensure_ascii=False, indent=2)
+            
+            PLACEHOLDERS.inc(kind='audio')
+            log.info("Audio placeholder created", language=language)
+            return filepath
+            
+        except Exception as e:
+            log.error("Error creating audio placeholder", error=str(e))
+            return None
+
+
+class LazyProvider:
+    """Create an object on first ``get()`` and share it between threads"""
+    
+    def __init__(self, factory):
+        self.factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+    
+    def get(self):
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    with stage('provider_init', provider=self.factory.__name__):
+                        self._instance = self.factory()
+        return self._instance
+    
+    def reset(self):
+        self._instance = None
+        self._lock = threading.Lock()
+
+story_generator = LazyProvider(GeminiStoryGenerator)
+image_generator = LazyProvider(ClipdropImageGenerator)
+audio_generator = LazyProvider(ProfessionalAudioGenerator)
+
+def _reset_after_fork():
+    # Provider clients hold sockets/gRPC channels that must not be shared with the parent
+    global _genai, _genai_lock
+    _genai, _genai_lock = None, threading.Lock()
+    for provider in (story_generator, image_generator, audio_generator):
+        provider.reset()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,186 @@
+"""Generated media layout and orphaned-file garbage collection.
+
+New files are sharded into ``<dir>/<xx>/<filename>`` where ``xx`` is derived
+from a hash of the filename, so no single directory grows without bound.
+Files written before sharding stay where they are and are still collected.
+"""
+import hashlib
+import os
+import socket
+import sqlite3
+import threading
+import time
+from telemetry import REGISTRY, get_logger
+
+log = get_logger('media')
+
+IMAGE_DIR = 'static/images'
+AUDIO_DIR = 'static/audio'
+MEDIA_DIRS = (IMAGE_DIR, AUDIO_DIR)
+
+# Only files the generators create are eligible for deletion
+GENERATED_PREFIXES = ('clipdrop_', 'placeholder_', 'professional_audio_', 'audio_placeholder_')
+
+GC_FILES = REGISTRY.counter(
+    'storyteller_media_gc_files_total', 'Files seen by the media garbage collector', ('action',))
+
+
+def shard_path(directory, filename):
+    """Return the sharded path for a new media file, creating its directory"""
+    shard = hashlib.sha1(filename.encode('utf-8')).hexdigest()[:2]
+    shard_dir = f"{directory}/{shard}"
+    os.makedirs(shard_dir, exist_ok=True)
+    return f"{shard_dir}/{filename}"
+
+
+class MediaGarbageCollector:
+    def __init__(self, db, drafts=None, media_dirs=MEDIA_DIRS, grace_seconds=None):
+        self.db = db
+        self.drafts = drafts
+        self.media_dirs = media_dirs
+        if grace_seconds is None:
+            grace_seconds = float(os.getenv('MEDIA_GC_GRACE_HOURS', '24')) * 3600
+        if drafts is not None and grace_seconds < drafts.ttl:
+            # A draft's files are written before the draft itself, so never collect inside its lifetime
+            log.warning("Media GC grace period raised to the draft TTL",
+                        requested_s=grace_seconds, grace_s=drafts.ttl)
+            grace_seconds = drafts.ttl
+        self.grace_seconds = grace_seconds
+        self._cursor = 0
+        self._lock = threading.Lock()
+
+    def referenced_paths(self):
+        """Paths referenced by saved stories and unexpired drafts.
+
+        Drafts are read before stories: /save_story pops the draft and then
+        inserts the story, so a promotion between the two reads is still
+        seen in the stories.
+        """
+        referenced = set()
+        if self.drafts is not None:
+            for draft in self.drafts.live_drafts():
+                referenced.update(draft.get('image_paths') or [])
+                if draft.get('audio_path'):
+                    referenced.add(draft['audio_path'])
+        referenced.update(self.db.iter_media_paths())
+        return {path.replace('\\', '/') for path in referenced if path}
+
+    def _shards(self):
+        """Every directory to scan: each media dir (legacy flat files) plus its shards"""
+        shards = []
+        for directory in self.media_dirs:
+            if not os.path.isdir(directory):
+                continue
+            shards.append(directory)
+            with os.scandir(directory) as entries:
+                shards.extend(sorted(f"{directory}/{entry.name}" for entry in entries
+                                     if entry.is_dir(follow_symlinks=False)))
+        return shards
+
+    def collect(self, dry_run=False, max_shards=None):
+        """Delete unreferenced generated files older than the grace period.
+
+        With ``max_shards`` only that many directories are scanned, resuming
+        where the previous call stopped, so periodic runs stay short.
+        """
+        with self._lock:
+            started = time.perf_counter()
+            stats = {'dry_run': dry_run, 'shards': 0, 'scanned': 0, 'referenced': 0,
+                     'too_young': 0, 'deleted': 0, 'bytes_freed': 0, 'errors': 0}
+            referenced = self.referenced_paths()
+            shards = self._shards()
+            if max_shards and shards:
+                start = self._cursor % len(shards)
+                selected = (shards[start:] + shards[:start])[:max_shards]
+                self._cursor = start + len(selected)
+            else:
+                selected = shards
+
+            cutoff = time.time() - self.grace_seconds
+            for shard in selected:
+                stats['shards'] += 1
+                self._collect_shard(shard, referenced, cutoff, dry_run, stats)
+
+            stats['duration_s'] = round(time.perf_counter() - started, 3)
+            log.info("Media GC finished", **stats)
+            return stats
+
+    def _collect_shard(self, shard, referenced, cutoff, dry_run, stats):
+        try:
+            entries = os.scandir(shard)
+        except OSError as e:
+            log.warning("Cannot scan media directory", directory=shard, error=str(e))
+            stats['errors'] += 1
+            return
+
+        with entries:
+            for entry in entries:
+                if not entry.name.startswith(GENERATED_PREFIXES) or not entry.is_file(follow_symlinks=False):
+                    continue
+                stats['scanned'] += 1
+                if f"{shard}/{entry.name}" in referenced:
+                    stats['referenced'] += 1
+                    continue
+                try:
+                    stat = entry.stat(follow_symlinks=False)
+                    if stat.st_mtime > cutoff:
+                        stats['too_young'] += 1
+                        continue
+                    if not dry_run:
+                        os.remove(entry.path)
+                        GC_FILES.inc(action='deleted')
+                    stats['deleted'] += 1
+                    stats['bytes_freed'] += stat.st_size
+                except FileNotFoundError:
+                    continue  # removed by someone else, e.g. a manual gc-media run
+                except OSError as e:
+                    log.warning("Cannot delete media file", path=entry.path, error=str(e))
+                    stats['errors'] += 1
+
+
+def acquire_lease(db_path, name, seconds, owner=None):
+    """Claim a named lease in SQLite for ``seconds``; True if ``owner`` holds it.
+
+    Lets every worker process schedule the same periodic job while only one
+    runs it. A holder that dies loses the lease once it expires.
+    """
+    owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+    now = time.time()
+    conn = sqlite3.connect(db_path, timeout=10)
+    try:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS leases (
+                name TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+        conn.execute("INSERT OR IGNORE INTO leases (name, owner, expires_at) VALUES (?, '', 0)", (name,))
+        acquired = conn.execute(
+            'UPDATE leases SET owner = ?, expires_at = ? WHERE name = ? AND (expires_at <= ? OR owner = ?)',
+            (owner, now + seconds, name, now, owner)).rowcount
+        conn.commit()
+    finally:
+        conn.close()
+    return bool(acquired)
+
+
+def start_background_gc(collector, interval_seconds, max_shards=16):
+    """Run ``collector`` every ``interval_seconds`` on a daemon thread.
+
+    Every worker may start the thread; a lease in the database lets only one
+    process collect at a time.
+    """
+    def loop():
+        while True:
+            time.sleep(interval_seconds)
+            try:
+                # Outlives the interval so the holder renews it before anyone else can claim it
+                if acquire_lease(collector.db.db_path, 'media_gc', interval_seconds * 1.5):
+                    collector.collect(max_shards=max_shards)
+            except Exception as e:
+                log.exception("Background media GC failed", error=str(e))
+
+    thread = threading.Thread(target=loop, name='media-gc', daemon=True)
+    thread.start()
+    return thread
@@ -1,13 +1,45 @@
 import sqlite3
 from datetime import datetime
 import json
+from telemetry import get_logger
+
+log = get_logger('models')
+
+# Bump when adding a migration to migrate()
+SCHEMA_VERSION = 3
 
 class Database:
     def __init__(self, db_path='stories.db'):
         self.db_path = db_path
+    
+    def migrate(self):
+        """Create and upgrade the schema; run once per deployment via `flask init-db`"""
         self.init_db()
         self.migrate_add_age_group()
         self.migrate_add_image_style()
+        
+        conn = sqlite3.connect(self.db_path)
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        conn.commit()
+        conn.close()
+    
+    def schema_version(self):
+        conn = sqlite3.connect(self.db_path)
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        conn.close()
+        return version
+    
+    def ensure_schema(self):
+        """Cheap startup check: a single PRAGMA read, never a migration.
+
+        Every worker calls this, so migrating here would race on ALTER TABLE;
+        a stale schema is only reported.
+        """
+        version = self.schema_version()
+        if version < SCHEMA_VERSION:
+            log.warning("Database schema out of date, run `flask --app app init-db`",
+                        db_path=self.db_path, version=version, expected=SCHEMA_VERSION)
+        return version
     
     def init_db(self):
         conn = sqlite3.connect(self.db_path)
@@ -38,13 +70,13 @@ class Database:
             columns = [info[1] for info in cursor.fetchall()]
             
             if 'age_group' not in columns:
-                print("Adding 'age_group' column to stories table...")
+                log.info("Adding column to stories table", column='age_group')
                 cursor.execute("ALTER TABLE stories ADD COLUMN age_group TEXT DEFAULT '25+';")
                 conn.commit()
-                print("Migration completed successfully!")
+                log.info("Migration completed", column='age_group')
             
         except Exception as e:
-            print(f"Migration error: {e}")
+            log.error("Migration error", column='age_group', error=str(e))
         finally:
             conn.close()
     
@@ -58,13 +90,13 @@ class Database:
             columns = [info[1] for info in cursor.fetchall()]
             
             if 'image_style' not in columns:
-                print("Adding 'image_style' column to stories table...")
+                log.info("Adding column to stories table", column='image_style')
                 cursor.execute("ALTER TABLE stories ADD COLUMN image_style TEXT DEFAULT 'cartoon';")
                 conn.commit()
-                print("Image style migration completed successfully!")
+                log.info("Migration completed", column='image_style')
             
         except Exception as e:
-            print(f"Migration error for image_style: {e}")
+            log.error("Migration error", column='image_style', error=str(e))
         finally:
             conn.close()
     
@@ -83,6 +115,29 @@ class Database:
         
         return story_id
     
+    def save_stories(self, stories):
+        """Insert many stories in one transaction and return their ids in order"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        story_ids = []
+        
+        try:
+            for story in stories:
+                cursor.execute('''
+                    INSERT INTO stories (theme, language, age_group, chunks, image_paths, audio_path, image_style)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (story['theme'], story['language'], story['age_group'], json.dumps(story['chunks']),
+                      json.dumps(story['image_paths']), story['audio_path'], story.get('image_style', 'cartoon')))
+                story_ids.append(cursor.lastrowid)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        
+        return story_ids
+    
     def get_all_stories(self):
         conn = sqlite3.connect(self.db_path)
         conn.row_factory = sqlite3.Row
@@ -127,3 +182,19 @@ class Database:
             return story_dict
         
         return None
+    
+    def iter_media_paths(self):
+        """Yield every image and audio path referenced by a saved story"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        try:
+            for image_paths, audio_path in cursor.execute('SELECT image_paths, audio_path FROM stories'):
+                try:
+                    yield from json.loads(image_paths)
+                except (TypeError, ValueError):
+                    pass
+                if audio_path:
+                    yield audio_path
+        finally:
+            conn.close()
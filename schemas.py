@@ -0,0 +1,109 @@
+"""Compact validation for story payloads posted to /save_story."""
+import json
+import re
+from media import AUDIO_DIR, IMAGE_DIR
+
+MAX_CHUNKS = 20
+MAX_TEXT_LENGTH = 5000
+
+# field: (type, required, default, max length)
+STORY_SCHEMA = {
+    'story_title': (str, True, '', 300),
+    'theme': (str, True, '', 300),
+    'language': (str, True, '', 50),
+    'age_group': (str, False, '', 20),
+    'image_style': (str, False, 'cartoon', 50),
+    'chunks': (list, True, [], MAX_CHUNKS),
+    'image_paths': (list, False, [], MAX_CHUNKS),
+    'audio_path': (str, False, '', 300),
+}
+
+LIST_FIELDS = [name for name, spec in STORY_SCHEMA.items() if spec[0] is list]
+
+_EMPTY_MARKERS = ('', 'undefined', 'null', 'None')
+
+
+class _Malformed:
+    """Stands in for a form list field that was not a JSON-encoded list"""
+
+    def __init__(self, raw):
+        self.raw = raw
+
+
+# A file directly in the media dir (pre-sharding) or in one two-hex-digit shard
+_MEDIA_NAME = re.compile(r'(?:[0-9a-f]{2}/)?[A-Za-z0-9_-][A-Za-z0-9_.-]*')
+
+
+def _is_media_path(path, directory):
+    prefix = f"{directory}/"
+    return path.startswith(prefix) and _MEDIA_NAME.fullmatch(path[len(prefix):]) is not None
+
+
+def form_to_payload(form):
+    """Convert a legacy form post (lists encoded as JSON strings) to a payload dict"""
+    payload = {name: form.get(name) for name in STORY_SCHEMA if name in form}
+    for name in LIST_FIELDS:
+        raw = (payload.get(name) or '').strip()
+        if raw in _EMPTY_MARKERS:
+            payload.pop(name, None)
+            continue
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            value = None
+        # Forms always post lists as JSON arrays; anything else is reported by validate_story
+        payload[name] = value if isinstance(value, list) else _Malformed(raw)
+    return payload
+
+
+def validate_story(payload):
+    """Validate a story payload against STORY_SCHEMA.
+
+    Returns (story, errors); ``story`` only contains schema fields with
+    surrounding whitespace stripped and defaults filled in.
+    """
+    if not isinstance(payload, dict):
+        return None, ['Body must be a JSON object']
+
+    story = {}
+    errors = []
+    for name, (expected, required, default, max_length) in STORY_SCHEMA.items():
+        value = payload.get(name)
+        if value is None:
+            value = default
+
+        if isinstance(value, _Malformed):
+            errors.append(f"{name} must be a JSON-encoded list")
+            continue
+        if expected is str and isinstance(value, str):
+            value = value.strip()
+        elif expected is list and isinstance(value, str) and value:
+            # A single chunk or path in a JSON body is accepted as a one-item list
+            value = [value]
+        elif not isinstance(value, expected):
+            errors.append(f"{name} must be a {expected.__name__}")
+            continue
+
+        if expected is list:
+            # Failed generations leave null entries behind; drop them like empty strings
+            value = [item for item in value if item]
+            if not all(isinstance(item, str) for item in value):
+                errors.append(f"{name} must only contain strings")
+                continue
+            value = [item.strip() for item in value if item.strip()]
+            if any(len(item) > MAX_TEXT_LENGTH for item in value):
+                errors.append(f"{name} items must be at most {MAX_TEXT_LENGTH} characters")
+
+        if required and not value:
+            errors.append(f"{name} missing")
+        elif len(value) > max_length:
+            errors.append(f"{name} is too long")
+        story[name] = value
+
+    if not errors:
+        if not all(_is_media_path(path, IMAGE_DIR) for path in story['image_paths']):
+            errors.append(f"image_paths must point into {IMAGE_DIR}")
+        if story['audio_path'] and not _is_media_path(story['audio_path'], AUDIO_DIR):
+            errors.append(f"audio_path must point into {AUDIO_DIR}")
+
+    return (None, errors) if errors else (story, [])
@@ -0,0 +1,309 @@
+"""Structured logging, per-request trace ids and Prometheus-format metrics."""
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Latency buckets in seconds; provider calls routinely take several seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_trace_id = ContextVar('trace_id', default=None)
+
+
+# Trace ids
+
+def new_trace_id():
+    return uuid.uuid4().hex[:16]
+
+def get_trace_id():
+    return _trace_id.get()
+
+def set_trace_id(trace_id):
+    """Bind a trace id to the current context and return a reset token"""
+    return _trace_id.set(trace_id)
+
+def reset_trace_id(token):
+    try:
+        _trace_id.reset(token)
+    except ValueError:
+        # Token created in another context (e.g. a worker thread)
+        _trace_id.set(None)
+
+
+# Metrics
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.extend(f'{name}="{_escape_label(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    type_name = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.type_name}']
+
+
+class Counter(_Metric):
+    type_name = 'counter'
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def collect(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = self.header()
+        for key, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class Histogram(_Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'buckets': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            state['buckets'][index] += 1
+            state['sum'] += value
+            state['count'] += 1
+
+    def snapshot(self):
+        """Return {label tuple: {'sum', 'count'}} for reporting"""
+        with self._lock:
+            return {key: {'sum': state['sum'], 'count': state['count']} for key, state in self._values.items()}
+
+    def collect(self):
+        with self._lock:
+            items = sorted((key, dict(state, buckets=list(state['buckets']))) for key, state in self._values.items())
+        lines = self.header()
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), state['buckets']):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(state["sum"])}')
+            lines.append(f'{self.name}_count{labels} {state["count"]}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, help_text, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, labelnames, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as {metric.type_name}")
+            return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._get_or_create(Counter, name, help_text, labelnames)
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    def render(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    'storyteller_http_requests_total', 'HTTP requests handled', ('method', 'endpoint', 'status'))
+HTTP_LATENCY = REGISTRY.histogram(
+    'storyteller_http_request_duration_seconds', 'HTTP request latency', ('method', 'endpoint'))
+STAGE_LATENCY = REGISTRY.histogram(
+    'storyteller_stage_duration_seconds', 'Latency of individual pipeline stages', ('stage', 'outcome'))
+FALLBACKS = REGISTRY.counter(
+    'storyteller_fallbacks_total', 'Times a provider result was replaced by a fallback', ('kind',))
+PLACEHOLDERS = REGISTRY.counter(
+    'storyteller_placeholders_total', 'Placeholder media files created', ('kind',))
+CACHE_REQUESTS = REGISTRY.counter(
+    'storyteller_cache_requests_total', 'Cache lookups by result', ('cache', 'result'))
+
+
+# Structured logging
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        payload = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        trace_id = get_trace_id()
+        if trace_id:
+            payload['trace_id'] = trace_id
+        payload.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class StructuredLogger:
+    """Thin wrapper so call sites can pass fields as keyword arguments"""
+
+    def __init__(self, name):
+        self._logger = logging.getLogger(name)
+
+    def is_enabled_for(self, level):
+        return self._logger.isEnabledFor(level)
+
+    def _log(self, level, msg, fields, exc_info=False):
+        if self._logger.isEnabledFor(level):
+            self._logger.log(level, msg, exc_info=exc_info, extra={'fields': fields})
+
+    def debug(self, msg, **fields):
+        self._log(logging.DEBUG, msg, fields)
+
+    def info(self, msg, **fields):
+        self._log(logging.INFO, msg, fields)
+
+    def warning(self, msg, **fields):
+        self._log(logging.WARNING, msg, fields)
+
+    def error(self, msg, **fields):
+        self._log(logging.ERROR, msg, fields)
+
+    def exception(self, msg, **fields):
+        self._log(logging.ERROR, msg, fields, exc_info=True)
+
+
+class SampledLogger(StructuredLogger):
+    """Logger whose DEBUG lines are emitted for only a fraction of calls.
+
+    Hot request paths use this so debug output costs nothing unless DEBUG is
+    enabled, and even then only ``rate`` of the calls hit stdout.
+    """
+
+    def __init__(self, name, rate):
+        super().__init__(name)
+        self.rate = rate
+
+    def debug(self, msg, **fields):
+        if self._logger.isEnabledFor(logging.DEBUG) and random.random() < self.rate:
+            self._logger.log(logging.DEBUG, msg, extra={'fields': dict(fields, sample_rate=self.rate)})
+
+
+_configured = False
+
+def configure_logging(level=None):
+    """Attach the JSON handler to the 'storyteller' logger tree (idempotent)"""
+    global _configured
+    root = logging.getLogger('storyteller')
+    root.setLevel((level or os.getenv('LOG_LEVEL', 'INFO')).upper())
+    if not _configured:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JsonFormatter())
+        root.addHandler(handler)
+        root.propagate = False
+        _configured = True
+    return root
+
+def get_logger(name):
+    return StructuredLogger(f'storyteller.{name}')
+
+def get_sampled_logger(name, rate=None):
+    if rate is None:
+        rate = float(os.getenv('DEBUG_LOG_SAMPLE_RATE', '0.01'))
+    return SampledLogger(f'storyteller.{name}', rate)
+
+
+_log = get_logger('telemetry')
+_stage_listeners = []
+
+def add_stage_listener(listener):
+    """Call ``listener(stage, outcome, seconds)`` after every stage (used by benchmarks)"""
+    _stage_listeners.append(listener)
+
+def remove_stage_listener(listener):
+    _stage_listeners.remove(listener)
+
+@contextmanager
+def stage(name, **fields):
+    """Time a pipeline stage.
+
+    Yields a dict; set ``span['outcome']`` to e.g. 'fallback' when the stage
+    completed without raising but did not produce a real result.
+    """
+    span = {'outcome': 'ok'}
+    start = time.perf_counter()
+    try:
+        yield span
+    except BaseException:
+        span['outcome'] = 'error'
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_LATENCY.observe(elapsed, stage=name, outcome=span['outcome'])
+        for listener in _stage_listeners:
+            listener(name, span['outcome'], elapsed)
+        _log.debug('stage finished', stage=name, outcome=span['outcome'],
+                   duration_ms=round(elapsed * 1000, 2), **fields)
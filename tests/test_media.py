@@ -0,0 +1,124 @@
+import os
+import time
+
+import pytest
+
+from drafts import DraftStore
+from media import MediaGarbageCollector, acquire_lease
+
+DAY = 24 * 3600
+
+
+class FakeDatabase:
+    def __init__(self, db_path, paths=()):
+        self.db_path = db_path
+        self.paths = list(paths)
+
+    def iter_media_paths(self):
+        return iter(self.paths)
+
+
+def make_file(path, age_seconds=0):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'x' * 10)
+    mtime = time.time() - age_seconds
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+@pytest.fixture
+def media(tmp_path):
+    images = (tmp_path / 'images').as_posix()
+    audio = (tmp_path / 'audio').as_posix()
+    files = {
+        'saved': make_file(f"{images}/ab/clipdrop_saved.png", 2 * DAY),
+        'draft': make_file(f"{audio}/cd/professional_audio_draft.mp3", 2 * DAY),
+        'young': make_file(f"{images}/ab/placeholder_young.png", 60),
+        'sharded': make_file(f"{images}/ef/clipdrop_orphan.png", 2 * DAY),
+        'legacy': make_file(f"{images}/placeholder_legacy.png", 2 * DAY),
+        'legacy_saved': make_file(f"{images}/clipdrop_legacy_saved.png", 2 * DAY),
+        'foreign': make_file(f"{images}/ab/logo.png", 2 * DAY),
+    }
+    db_path = str(tmp_path / 'stories.db')
+    db = FakeDatabase(db_path, [files['saved'], files['legacy_saved']])
+    drafts = DraftStore(db_path, ttl=3600)
+    drafts.put({'image_paths': [], 'audio_path': files['draft']})
+    collector = MediaGarbageCollector(db, drafts, media_dirs=(images, audio), grace_seconds=DAY)
+    return collector, files
+
+
+def test_collect_deletes_only_old_unreferenced_generated_files(media):
+    collector, files = media
+
+    stats = collector.collect()
+
+    assert not os.path.exists(files['sharded'])
+    assert not os.path.exists(files['legacy'])
+    for kept in ('saved', 'draft', 'young', 'legacy_saved', 'foreign'):
+        assert os.path.exists(files[kept]), kept
+    assert stats['deleted'] == 2
+    assert stats['referenced'] == 3
+    assert stats['too_young'] == 1
+    assert stats['errors'] == 0
+
+
+def test_dry_run_deletes_nothing(media):
+    collector, files = media
+
+    stats = collector.collect(dry_run=True)
+
+    assert stats['deleted'] == 2
+    assert all(os.path.exists(path) for path in files.values())
+
+
+def test_max_shards_resumes_where_previous_run_stopped(media):
+    collector, files = media
+
+    seen = sum(collector.collect(max_shards=2)['shards'] for _ in range(3))
+
+    assert seen == 6  # images, images/ab, images/ef, audio, audio/cd, then wraps around
+    assert not os.path.exists(files['sharded'])
+    assert not os.path.exists(files['legacy'])
+
+
+def test_grace_period_is_never_shorter_than_draft_ttl(tmp_path):
+    db_path = str(tmp_path / 'stories.db')
+    drafts = DraftStore(db_path, ttl=6 * 3600)
+
+    collector = MediaGarbageCollector(FakeDatabase(db_path), drafts, grace_seconds=60)
+
+    assert collector.grace_seconds == 6 * 3600
+
+
+def test_lease_is_held_by_one_owner_until_it_expires(tmp_path):
+    db_path = str(tmp_path / 'stories.db')
+
+    assert acquire_lease(db_path, 'media_gc', 60, owner='a')
+    assert acquire_lease(db_path, 'media_gc', 60, owner='a')
+    assert not acquire_lease(db_path, 'media_gc', 60, owner='b')
+    assert acquire_lease(db_path, 'media_gc', -1, owner='a')
+    assert acquire_lease(db_path, 'media_gc', 60, owner='b')
+
+
+def test_draft_promoted_between_reads_is_still_referenced(tmp_path):
+    db_path = str(tmp_path / 'stories.db')
+    drafts = DraftStore(db_path, ttl=3600)
+    draft_id = drafts.put({'image_paths': ['static/images/ab/clipdrop_promoted.png']})
+    db = FakeDatabase(db_path)
+    reads = {'live_drafts': drafts.live_drafts, 'iter_media_paths': db.iter_media_paths}
+
+    def promote_after_first_read(source):
+        def read():
+            results = list(reads[source]())
+            if drafts.pop(draft_id):
+                # /save_story runs here: the draft row goes away and the story appears
+                db.paths.append('static/images/ab/clipdrop_promoted.png')
+            return iter(results)
+        return read
+
+    drafts.live_drafts = promote_after_first_read('live_drafts')
+    db.iter_media_paths = promote_after_first_read('iter_media_paths')
+    collector = MediaGarbageCollector(db, drafts, grace_seconds=DAY)
+
+    assert 'static/images/ab/clipdrop_promoted.png' in collector.referenced_paths()
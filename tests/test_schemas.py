@@ -0,0 +1,104 @@
+import json
+
+import pytest
+
+from schemas import form_to_payload, validate_story
+
+
+def story(**overrides):
+    payload = {
+        'story_title': 'The Clever Crow',
+        'theme': 'Panchatantra',
+        'language': 'English',
+        'chunks': ['Once upon a time', 'The end'],
+        'image_paths': ['static/images/ab/clipdrop_0.png'],
+        'audio_path': 'static/audio/cd/professional_audio_English.mp3',
+    }
+    payload.update(overrides)
+    return payload
+
+
+def form(**overrides):
+    fields = story(**overrides)
+    return {name: json.dumps(value) if isinstance(value, list) else value
+            for name, value in fields.items()}
+
+
+def test_valid_json_payload_fills_defaults():
+    saved, errors = validate_story(story(story_title='  The Clever Crow  '))
+
+    assert errors == []
+    assert saved['story_title'] == 'The Clever Crow'
+    assert saved['image_style'] == 'cartoon'
+
+
+def test_valid_form_payload():
+    saved, errors = validate_story(form_to_payload(form()))
+
+    assert errors == []
+    assert saved['chunks'] == ['Once upon a time', 'The end']
+
+
+def test_json_body_accepts_single_string_as_one_item_list():
+    saved, errors = validate_story(story(chunks='Only chapter'))
+
+    assert errors == []
+    assert saved['chunks'] == ['Only chapter']
+
+
+@pytest.mark.parametrize('raw', ['["a","b"', 'hello world', '"hello"', '{"a": 1}'])
+def test_form_rejects_chunks_that_are_not_a_json_list(raw):
+    payload = form_to_payload(dict(form(), chunks=raw))
+
+    saved, errors = validate_story(payload)
+
+    assert saved is None
+    assert errors == ['chunks must be a JSON-encoded list']
+
+
+@pytest.mark.parametrize('make', [story, form])
+def test_null_only_chunks_are_missing(make):
+    payload = make(chunks=[None])
+    if make is form:
+        payload = form_to_payload(payload)
+
+    saved, errors = validate_story(payload)
+
+    assert saved is None
+    assert errors == ['chunks missing']
+
+
+@pytest.mark.parametrize('chunks', [[1, 'text'], [['nested']], [{'text': 'x'}]])
+def test_non_string_items_are_rejected(chunks):
+    for payload in (story(chunks=chunks), form_to_payload(form(chunks=chunks))):
+        saved, errors = validate_story(payload)
+
+        assert saved is None
+        assert errors == ['chunks must only contain strings']
+
+
+@pytest.mark.parametrize('path', [
+    '/etc/passwd',
+    'static/audio/ab/clipdrop_0.png',
+    'static/images/../../app.py',
+    'static/images/ab/%2e%2e/x.png',
+    'static/images\\ab\\x.png',
+    'static/imagesx/clipdrop_0.png',
+])
+def test_image_paths_outside_media_dir_are_rejected(path):
+    for payload in (story(image_paths=[path]), form_to_payload(form(image_paths=[path]))):
+        saved, errors = validate_story(payload)
+
+        assert saved is None
+        assert errors == ['image_paths must point into static/images']
+
+
+def test_audio_path_outside_media_dir_is_rejected():
+    saved, errors = validate_story(story(audio_path='static/images/ab/clipdrop_0.png'))
+
+    assert saved is None
+    assert errors == ['audio_path must point into static/audio']
+
+
+def test_non_object_body_is_rejected():
+    assert validate_story(['not', 'an', 'object']) == (None, ['Body must be a JSON object'])